@@ -1,3 +1,152 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.forms import AdminUserCreationForm, UserChangeForm as BaseUserChangeForm
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils.functional import cached_property
 
-# Register your models here.
+from . import tarefas
+from .models import User, Profile, Video, Quiz, ThrottleBucket
+
+
+class ContagemEstimadaPaginator(Paginator):
+    """
+    Usa a estimativa do planner (pg_class.reltuples) em vez de COUNT(*) quando a
+    changelist não tem filtro e a tabela é grande. Em outros bancos conta normalmente.
+    """
+    limite_estimativa = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table])
+                linha = cursor.fetchone()
+            if linha and linha[0] > self.limite_estimativa:
+                return int(linha[0])
+        return super().count
+
+
+# Buscas usam lookups sensíveis a maiúsculas (exact/startswith): são os que os índices b-tree
+# (e os *_like com varchar_pattern_ops no Postgres) atendem; iexact/istartswith viram UPPER(col)
+class TabelaGrandeAdmin(admin.ModelAdmin):
+    paginator = ContagemEstimadaPaginator
+    show_full_result_count = False  # evita o segundo COUNT(*) sem filtros
+    list_per_page = 50
+
+
+class ProfileInline(admin.StackedInline):
+    model = Profile
+    can_delete = False
+
+
+class UserCreationForm(AdminUserCreationForm):
+    class Meta(AdminUserCreationForm.Meta):
+        model = User
+        fields = ('username', 'matricula', 'email')
+
+
+class UserChangeForm(BaseUserChangeForm):
+    class Meta(BaseUserChangeForm.Meta):
+        model = User
+
+
+@admin.register(User)
+class UserAdmin(TabelaGrandeAdmin, BaseUserAdmin):
+    form = UserChangeForm
+    add_form = UserCreationForm
+    fieldsets = (
+        (None, {'fields': ('username', 'matricula', 'email', 'password')}),
+        ('Permissões', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
+        ('Datas', {'fields': ('last_login', 'created_at', 'updated_at')}),
+    )
+    add_fieldsets = (
+        (None, {
+            'classes': ('wide',),
+            'fields': ('username', 'matricula', 'email', 'usable_password', 'password1', 'password2'),
+        }),
+    )
+    list_display = ('id', 'username', 'matricula', 'email', 'nivel', 'is_active', 'is_staff', 'created_at')
+    list_select_related = ('profile',)
+    list_filter = ('is_active', 'is_staff')
+    search_fields = ('matricula__exact', 'username__startswith')
+    ordering = ('-id',)
+    readonly_fields = ('last_login', 'created_at', 'updated_at')
+    inlines = [ProfileInline]
+    actions = ['desativar_usuarios']
+
+    def get_inlines(self, request, obj):
+        # No cadastro o perfil é criado pelo signal create_user_profile; o inline criaria um segundo
+        return [] if obj is None else super().get_inlines(request, obj)
+
+    @admin.display(description='Nível', ordering='profile__level')
+    def nivel(self, obj):
+        return obj.profile.get_level_display() if hasattr(obj, 'profile') else '-'
+
+    @admin.action(description='Desativar usuários selecionados (em segundo plano)')
+    def desativar_usuarios(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        tarefas.enfileirar(tarefas.desativar_usuarios, ids)
+        self.message_user(request, f"{len(ids)} usuário(s) enfileirado(s) para desativação.")
+
+
+@admin.register(Profile)
+class ProfileAdmin(TabelaGrandeAdmin):
+    list_display = ('id', 'user', 'level', 'area')
+    list_select_related = ('user',)
+    list_filter = ('level',)
+    search_fields = ('user__matricula__exact', 'user__username__startswith')
+    raw_id_fields = ('user',)
+
+
+@admin.register(Video)
+class VideoAdmin(TabelaGrandeAdmin):
+    list_display = ('id', 'titulo', 'duracao', 'tem_transcricao', 'created_at')
+    search_fields = ('titulo__startswith',)
+    readonly_fields = ('created_at', 'updated_at')
+    actions = ['regenerar_quiz', 'retranscrever']
+
+    def get_queryset(self, request):
+        # A transcrição (JSON completo da AWS) e a legenda não aparecem na listagem
+        return super().get_queryset(request).defer('transcricao', 'legenda').annotate(
+            _tem_transcricao=ExpressionWrapper(Q(transcricao__isnull=False), output_field=BooleanField())
+        )
+
+    @admin.display(description='Transcrição', boolean=True, ordering='_tem_transcricao')
+    def tem_transcricao(self, obj):
+        return obj._tem_transcricao
+
+    @admin.action(description='Regenerar quiz (em segundo plano)')
+    def regenerar_quiz(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        for video_id in ids:
+            tarefas.enfileirar(tarefas.regenerar_quiz, video_id)
+        self.message_user(request, f"{len(ids)} vídeo(s) enfileirado(s) para gerar o quiz novamente.")
+
+    @admin.action(description='Transcrever novamente (em segundo plano)')
+    def retranscrever(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        for video_id in ids:
+            tarefas.enfileirar(tarefas.retranscrever_video, video_id)
+        self.message_user(request, f"{len(ids)} vídeo(s) enfileirado(s) para nova transcrição.")
+
+
+@admin.register(Quiz)
+class QuizAdmin(TabelaGrandeAdmin):
+    list_display = ('id', 'video', 'criado_em')
+    list_select_related = ('video',)
+    search_fields = ('video__titulo__startswith',)
+    raw_id_fields = ('video',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('perguntas', 'video__transcricao', 'video__legenda')
+
+
+@admin.register(ThrottleBucket)
+class ThrottleBucketAdmin(admin.ModelAdmin):
+    list_display = ('chave', 'tokens', 'rejeicoes')
+    search_fields = ('chave__startswith',)
+    ordering = ('-rejeicoes',)
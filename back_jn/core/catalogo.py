@@ -0,0 +1,177 @@
+import datetime
+import gzip
+import io
+import json
+import zlib
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .models import Video, Quiz
+
+# Exportação/importação do catálogo em NDJSON, um registro por linha:
+#   {"tipo": "video", "id": ..., "titulo": ...}
+#   {"tipo": "transcricao", "video": ..., "transcricao": {...}}
+#   {"tipo": "quiz", "video": ..., "perguntas": [...]}
+# Transcrições saem em registros próprios para que a listagem de vídeos não carregue os blobs,
+# e tudo é lido com iterator() para manter a memória limitada independente do tamanho da tabela.
+
+TIPOS = ('videos', 'transcricoes', 'quizzes')
+CAMPOS_VIDEO = ['id', 'titulo', 'duracao', 'link', 'legenda', 'id_quiz', 'created_at', 'updated_at']
+TAMANHO_CHUNK = 500
+TAMANHO_BLOCO_GZIP = 64 * 1024
+
+
+class _Encoder(DjangoJSONEncoder):
+    # O DjangoJSONEncoder corta datas em milissegundos; num backup elas precisam voltar idênticas
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def exportar_registros(tipos=TIPOS):
+    if 'videos' in tipos:
+        videos = Video.objects.order_by('id').values(*CAMPOS_VIDEO)
+        for video in videos.iterator(chunk_size=TAMANHO_CHUNK):
+            yield {'tipo': 'video', **video}
+
+    if 'transcricoes' in tipos:
+        transcricoes = Video.objects.filter(transcricao__isnull=False).order_by('id').values_list('id', 'transcricao')
+        # Chunk menor: cada linha aqui pode ter vários MB
+        for video_id, transcricao in transcricoes.iterator(chunk_size=50):
+            yield {'tipo': 'transcricao', 'video': video_id, 'transcricao': transcricao}
+
+    if 'quizzes' in tipos:
+        quizzes = Quiz.objects.order_by('id').values_list('video_id', 'perguntas', 'criado_em')
+        for video_id, perguntas, criado_em in quizzes.iterator(chunk_size=TAMANHO_CHUNK):
+            yield {'tipo': 'quiz', 'video': video_id, 'perguntas': perguntas, 'criado_em': criado_em}
+
+
+def exportar_ndjson(tipos=TIPOS, compactar=False):
+    """Gera o NDJSON em bytes, opcionalmente já em gzip, sem montar o arquivo inteiro em memória."""
+    linhas = (
+        (json.dumps(registro, cls=_Encoder, ensure_ascii=False) + '\n').encode('utf-8')
+        for registro in exportar_registros(tipos)
+    )
+
+    if not compactar:
+        yield from linhas
+        return
+
+    compressor = zlib.compressobj(wbits=31)  # wbits=31 -> formato gzip
+    pendente = []
+    tamanho = 0
+    for linha in linhas:
+        pendente.append(linha)
+        tamanho += len(linha)
+        if tamanho >= TAMANHO_BLOCO_GZIP:
+            bloco = compressor.compress(b''.join(pendente))
+            pendente, tamanho = [], 0
+            if bloco:
+                yield bloco
+    yield compressor.compress(b''.join(pendente)) + compressor.flush()
+
+
+def abrir_ndjson(arquivo):
+    """Recebe um arquivo binário (local ou upload) e devolve as linhas em texto, descompactando gzip se preciso."""
+    inicio = arquivo.read(2)
+    arquivo.seek(0)
+    if inicio == b'\x1f\x8b':
+        arquivo = gzip.GzipFile(fileobj=arquivo)
+    return io.TextIOWrapper(arquivo, encoding='utf-8')
+
+
+def _converter(modelo, campos):
+    return {nome: modelo._meta.get_field(nome).to_python(valor) for nome, valor in campos.items()}
+
+
+def _gravar_lote(registros):
+    videos = []
+    transcricoes = []
+    quizzes = []
+    # bulk_create aplica auto_now/auto_now_add; as datas originais são regravadas depois com bulk_update,
+    # que grava os valores como estão
+    datas_videos = []
+    datas_quizzes = {}
+    for registro in registros:
+        tipo = registro.pop('tipo', None)
+        if tipo == 'video':
+            campos = _converter(Video, {c: registro.get(c) for c in CAMPOS_VIDEO})
+            videos.append(Video(**campos))
+            if campos['created_at'] and campos['updated_at']:
+                datas_videos.append(Video(id=campos['id'], created_at=campos['created_at'], updated_at=campos['updated_at']))
+        elif tipo == 'transcricao':
+            transcricoes.append(Video(id=registro['video'], transcricao=registro['transcricao']))
+        elif tipo == 'quiz':
+            quizzes.append(Quiz(video_id=registro['video'], perguntas=registro['perguntas']))
+            criado_em = _converter(Quiz, {'criado_em': registro.get('criado_em')})['criado_em']
+            if criado_em:
+                datas_quizzes[registro['video']] = criado_em
+
+    with transaction.atomic():
+        if videos:
+            Video.objects.bulk_create(
+                videos,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=['titulo', 'duracao', 'link', 'legenda', 'id_quiz', 'updated_at'],
+            )
+        if datas_videos:
+            Video.objects.bulk_update(datas_videos, ['created_at', 'updated_at'])
+        if transcricoes:
+            # Ids de vídeos que não existem são ignorados pelo próprio UPDATE
+            Video.objects.bulk_update(transcricoes, ['transcricao'], batch_size=50)
+        if quizzes:
+            existentes = set(Video.objects.filter(id__in=[q.video_id for q in quizzes]).values_list('id', flat=True))
+            Quiz.objects.bulk_create(
+                [q for q in quizzes if q.video_id in existentes],
+                update_conflicts=True,
+                unique_fields=['video'],
+                update_fields=['perguntas'],
+            )
+        if datas_quizzes:
+            Quiz.objects.bulk_update(
+                [
+                    Quiz(id=quiz_id, criado_em=datas_quizzes[video_id])
+                    for video_id, quiz_id in Quiz.objects.filter(video_id__in=datas_quizzes).values_list('video_id', 'id')
+                ],
+                ['criado_em'],
+            )
+
+
+def importar_ndjson(linhas, inicio=0, tamanho_lote=TAMANHO_CHUNK, ao_confirmar=None):
+    """
+    Importa as linhas em lotes com bulk_create/upsert, cada lote numa transação.
+
+    inicio é o número de linhas já importadas numa execução anterior (para retomar).
+    ao_confirmar(n) é chamado após cada lote gravado com o total de linhas processadas.
+    Retorna o total de linhas processadas.
+    """
+    lote = []
+    lidas = inicio
+    for numero, linha in enumerate(linhas, start=1):
+        if numero <= inicio:
+            continue
+        lidas = numero
+        linha = linha.strip()
+        if linha:
+            lote.append(json.loads(linha))
+        if len(lote) >= tamanho_lote:
+            _gravar_lote(lote)
+            lote = []
+            if ao_confirmar:
+                ao_confirmar(lidas)
+
+    if lote:
+        _gravar_lote(lote)
+    if ao_confirmar:
+        ao_confirmar(lidas)
+
+    # Os ids vieram do arquivo; sequências (Postgres) precisam voltar a apontar depois do maior id
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Video, Quiz]):
+            cursor.execute(sql)
+
+    return lidas
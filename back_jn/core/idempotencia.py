@@ -0,0 +1,185 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def _escopo(request):
+    if request.user and request.user.is_authenticated:
+        ident = f"user:{request.user.pk}"
+    else:
+        ident = f"ip:{request.META.get('REMOTE_ADDR')}"
+    return f"{ident}:{request.method}:{request.path}"
+
+
+def _impressao(request):
+    """Hash do método, caminho e corpo (arquivos entram por nome, tamanho e tipo)."""
+    digest = hashlib.sha256(f"{request.method}:{request.path}".encode())
+    for nome, arquivo in sorted(request.FILES.items()):
+        digest.update(f"{nome}:{arquivo.name}:{arquivo.size}:{arquivo.content_type}".encode())
+    if hasattr(request.data, 'items'):
+        dados = {k: v for k, v in request.data.items() if k not in request.FILES}
+    else:
+        dados = request.data
+    digest.update(json.dumps(dados, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _limpar_expiradas():
+    ttl = getattr(settings, 'IDEMPOTENCIA_TTL', 86400)
+    IdempotencyKey.objects.filter(criado_em__lt=timezone.now() - timedelta(seconds=ttl)).delete()
+
+
+def chave_registrada(request):
+    """True se a Idempotency-Key da requisição já foi vista (usado para não cobrar throttling de replays)."""
+    chave = request.META.get(HEADER)
+    if not chave:
+        return False
+    return IdempotencyKey.objects.filter(escopo=_escopo(request), chave=chave).exists()
+
+
+def _reservar(escopo, chave, impressao):
+    """Tenta criar o registro em andamento. Retorna (registro, criado)."""
+    _limpar_expiradas()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(escopo=escopo, chave=chave, impressao=impressao), True
+    except IntegrityError:
+        pass
+
+    registro = IdempotencyKey.objects.filter(escopo=escopo, chave=chave).first()
+    if registro is None or registro.impressao != impressao:
+        return registro, False
+
+    # Registro em andamento abandonado (worker morreu no meio): assume a execução
+    expiracao = getattr(settings, 'IDEMPOTENCIA_EXPIRACAO_EM_ANDAMENTO', 1800)
+    limite = timezone.now() - timedelta(seconds=expiracao)
+    assumiu = IdempotencyKey.objects.filter(
+        pk=registro.pk, status='em_andamento', atualizado_em__lt=limite
+    ).update(atualizado_em=timezone.now())
+    return registro, bool(assumiu)
+
+
+def _aguardar(escopo, chave, espera_maxima):
+    """
+    Espera a requisição original terminar e devolve a resposta dela.
+    Retorna None se a original falhou e liberou a chave.
+    """
+    intervalo = getattr(settings, 'IDEMPOTENCIA_INTERVALO_POLL', 1)
+    fim = time.monotonic() + espera_maxima
+
+    while True:
+        registro = IdempotencyKey.objects.filter(escopo=escopo, chave=chave).first()
+        if registro is None:
+            return None
+        if registro.status == 'concluido':
+            return Response(registro.resposta, status=registro.status_code, headers={'Idempotent-Replayed': 'true'})
+        if time.monotonic() >= fim:
+            return Response(
+                {"erro": "A requisição original com esta Idempotency-Key ainda está em processamento."},
+                status=409,
+                headers={'Retry-After': str(int(espera_maxima) or 1)},
+            )
+        time.sleep(intervalo)
+
+
+def _concluir(registro, status_code, dados):
+    registro.status = 'concluido'
+    registro.status_code = status_code
+    registro.resposta = dados
+    registro.save(update_fields=['status', 'status_code', 'resposta', 'atualizado_em'])
+
+
+def _acompanhar_stream(conteudo, registro, resultado):
+    # A chave só é concluída quando o stream termina; se terminar sem resultado
+    # (erro ou cliente desconectou), ela é liberada para uma nova tentativa
+    try:
+        yield from conteudo
+    finally:
+        if resultado:
+            _concluir(registro, resultado['status'], resultado['dados'])
+        else:
+            registro.delete()
+
+
+def idempotente(metodo=None, *, esperar=True):
+    """
+    Decorator para métodos de view que suporta o header Idempotency-Key.
+
+    A primeira requisição com a chave executa normalmente e tem a resposta guardada;
+    duplicadas esperam a original terminar e recebem a mesma resposta; reutilizar a chave
+    com outro corpo dá 422. Registros com mais de IDEMPOTENCIA_TTL segundos são apagados. Com esperar=False
+    (streams, que não dá para repetir ao vivo) a duplicada recebe 409 enquanto a original
+    roda. Respostas 5xx e exceções liberam a chave para que o cliente possa tentar de novo.
+
+    Um StreamingHttpResponse pode expor `resultado_idempotencia`, um dict que a view
+    preenche com {'status', 'dados'} quando o stream termina com sucesso.
+    """
+    if metodo is None:
+        return functools.partial(idempotente, esperar=esperar)
+
+    @functools.wraps(metodo)
+    def wrapper(self, request, *args, **kwargs):
+        chave = request.META.get(HEADER)
+        if not chave:
+            return metodo(self, request, *args, **kwargs)
+
+        espera_maxima = getattr(settings, 'IDEMPOTENCIA_ESPERA_MAXIMA', 60) if esperar else 0
+
+        if len(chave) > 255:
+            return Response({"erro": "Idempotency-Key muito longa (máximo 255 caracteres)."}, status=400)
+
+        escopo = _escopo(request)
+        impressao = _impressao(request)
+        while True:
+            registro, criado = _reservar(escopo, chave, impressao)
+            if criado:
+                break
+            if registro is not None and registro.impressao != impressao:
+                return Response(
+                    {"erro": "Esta Idempotency-Key já foi usada com uma requisição diferente."},
+                    status=422,
+                )
+            resposta = _aguardar(escopo, chave, espera_maxima)
+            if resposta is not None:
+                return resposta
+
+        # Throttles que deixaram a requisição passar por a chave já existir cobram agora,
+        # já que ela vai executar de fato
+        for throttle in getattr(request, 'throttles_adiados', ()):
+            if not throttle.cobrar(request, self):
+                registro.delete()
+                raise Throttled(throttle.wait())
+
+        try:
+            response = metodo(self, request, *args, **kwargs)
+        except Exception:
+            registro.delete()
+            raise
+
+        if isinstance(response, StreamingHttpResponse):
+            response.streaming_content = _acompanhar_stream(
+                response.streaming_content, registro, getattr(response, 'resultado_idempotencia', None)
+            )
+            return response
+
+        if not isinstance(response, Response) or response.status_code >= 500:
+            registro.delete()
+            return response
+
+        _concluir(registro, response.status_code, response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.relacionados import construir_indice
+
+
+class Command(BaseCommand):
+    help = "Recalcula o índice TF-IDF das transcrições e os vídeos relacionados de todo o acervo."
+
+    def handle(self, *args, **options):
+        total = construir_indice()
+        self.stdout.write(self.style.SUCCESS(f"Índice construído com {total} vídeos"))
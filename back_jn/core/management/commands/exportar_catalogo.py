@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalogo import TIPOS, exportar_ndjson
+
+
+class Command(BaseCommand):
+    help = "Exporta vídeos, transcrições e quizzes em NDJSON (opcionalmente gzip) com memória limitada."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saida', help="Arquivo de saída. Sem ele, escreve no stdout.")
+        parser.add_argument('--gzip', action='store_true', help="Compacta a saída em gzip.")
+        parser.add_argument('--tipos', default=','.join(TIPOS),
+                            help=f"Tipos a exportar, separados por vírgula ({', '.join(TIPOS)}).")
+
+    def handle(self, *args, **options):
+        tipos = [t.strip() for t in options['tipos'].split(',') if t.strip()]
+        invalidos = set(tipos) - set(TIPOS)
+        if invalidos:
+            raise CommandError(f"Tipos inválidos: {', '.join(sorted(invalidos))}")
+
+        saida = open(options['saida'], 'wb') if options['saida'] else sys.stdout.buffer
+        try:
+            for bloco in exportar_ndjson(tipos, compactar=options['gzip']):
+                saida.write(bloco)
+        finally:
+            if options['saida']:
+                saida.close()
+            else:
+                saida.flush()
@@ -0,0 +1,46 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.catalogo import TAMANHO_CHUNK, abrir_ndjson, importar_ndjson
+from core.relacionados import construir_indice
+
+
+class Command(BaseCommand):
+    help = "Importa um NDJSON (ou .gz) gerado pelo exportar_catalogo, em lotes, retomando do último lote gravado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--lote', type=int, default=TAMANHO_CHUNK, help="Registros por transação.")
+        parser.add_argument('--checkpoint', help="Arquivo de progresso (padrão: <arquivo>.checkpoint).")
+        parser.add_argument('--recomecar', action='store_true', help="Ignora o checkpoint e importa desde o início.")
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint'] or f"{options['arquivo']}.checkpoint"
+
+        inicio = 0
+        if not options['recomecar'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                inicio = int(f.read().strip() or 0)
+            self.stdout.write(f"Retomando após a linha {inicio}")
+
+        def salvar_checkpoint(processadas):
+            temporario = f"{checkpoint}.tmp"
+            with open(temporario, 'w') as f:
+                f.write(str(processadas))
+            os.replace(temporario, checkpoint)
+
+        with open(options['arquivo'], 'rb') as arquivo:
+            total = importar_ndjson(abrir_ndjson(arquivo), inicio=inicio, tamanho_lote=options['lote'],
+                                    ao_confirmar=salvar_checkpoint)
+
+        # Sem isso, um novo arquivo com o mesmo nome seria importado pulando as primeiras linhas
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(f"Importação concluída: {total} linhas processadas"))
+
+        # Transcrições importadas chegam por bulk_update, sem passar pelo atualizar_video
+        self.stdout.write("Recalculando o índice de vídeos relacionados...")
+        indexados = construir_indice()
+        self.stdout.write(self.style.SUCCESS(f"Índice construído com {indexados} vídeos"))
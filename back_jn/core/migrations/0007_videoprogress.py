@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-19 20:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_quiz'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao_maxima', models.FloatField(default=0)),
+                ('duracao', models.FloatField(blank=True, null=True)),
+                ('percentual', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progressos', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progressos', to='core.video')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'video'), name='progresso_unico_por_usuario_video')],
+            },
+        ),
+    ]
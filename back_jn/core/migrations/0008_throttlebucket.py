@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_videoprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=255, unique=True)),
+                ('tokens', models.FloatField()),
+                ('atualizado_em', models.FloatField()),
+                ('rejeicoes', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_videorelacionados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='titulo',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
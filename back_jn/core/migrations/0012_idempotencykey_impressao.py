@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_alter_video_titulo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='impressao',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='criado_em',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
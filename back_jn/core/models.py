@@ -62,7 +62,7 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 class Video(models.Model):
-    titulo = models.CharField(max_length=255)
+    titulo = models.CharField(max_length=255, db_index=True)  # busca do admin (titulo__startswith)
     duracao = models.DurationField(blank=True, null=True)  # Você pode preencher depois
     link = models.URLField()  # URL do S3
     legenda = models.TextField(blank=True, null=True)
@@ -84,3 +84,70 @@ class Quiz(models.Model):
 
     def __str__(self):
         return f"Quiz para: {self.video.titulo}"
+
+
+# Progresso agregado por (usuário, vídeo). Os heartbeats do player não viram linhas:
+# ficam no buffer de core/progresso.py e só o máximo de cada par é gravado aqui.
+class VideoProgress(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="progressos")
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="progressos")
+    posicao_maxima = models.FloatField(default=0)  # segundos
+    duracao = models.FloatField(blank=True, null=True)  # segundos, informado pelo player
+    percentual = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='progresso_unico_por_usuario_video'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.video.titulo}: {self.percentual:.0f}%"
+
+
+# Estado dos token buckets de throttling (core/throttling.py). Fica no banco para
+# ser compartilhado entre todos os workers; rejeicoes serve de contador para monitoramento.
+class ThrottleBucket(models.Model):
+    chave = models.CharField(max_length=255, unique=True)
+    tokens = models.FloatField()
+    atualizado_em = models.FloatField()  # time.time() da última reposição
+    rejeicoes = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.chave}: {self.tokens:.1f} tokens"
+
+
+# Chaves do header Idempotency-Key (core/idempotencia.py). A constraint única em
+# (escopo, chave) é o que serializa requisições duplicadas concorrentes.
+class IdempotencyKey(models.Model):
+    STATUS_CHOICES = [
+        ('em_andamento', 'Em andamento'),
+        ('concluido', 'Concluído'),
+    ]
+
+    escopo = models.CharField(max_length=255)  # usuário/ip + método + endpoint
+    chave = models.CharField(max_length=255)
+    impressao = models.CharField(max_length=64, blank=True)  # sha256 do método, caminho e corpo
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='em_andamento')
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    resposta = models.JSONField(blank=True, null=True)
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)  # limpeza por TTL
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['escopo', 'chave'], name='idempotency_key_unica_por_escopo'),
+        ]
+
+    def __str__(self):
+        return f"{self.escopo} [{self.chave}] - {self.status}"
+
+
+# Vizinhos pré-calculados por core/relacionados.py: a consulta de relacionados é só a leitura desta linha
+class VideoRelacionados(models.Model):
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name="relacionados")
+    vizinhos = models.JSONField(default=list)  # [{"video": id, "score": similaridade}, ...] em ordem decrescente
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Relacionados de: {self.video_id}"
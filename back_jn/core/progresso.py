@@ -0,0 +1,195 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+
+from .models import User, Video, VideoProgress
+
+logger = logging.getLogger(__name__)
+
+# Buffer write-behind dos heartbeats do player.
+# Cada processo acumula só o máximo por (user_id, video_id) e grava tudo de uma vez
+# a cada PROGRESSO_FLUSH_INTERVALO, em vez de fazer um INSERT/UPDATE por heartbeat.
+# Quem grava é uma thread por processo; o heartbeat que encontrar o prazo vencido também grava.
+_lock = threading.Lock()
+_pendentes = {}  # (user_id, video_id) -> [posicao_maxima, duracao]
+_ultimo_flush = time.monotonic()
+_flusher_pid = None  # processo em que a thread de flush periódico já foi iniciada
+
+
+def _intervalo():
+    return getattr(settings, 'PROGRESSO_FLUSH_INTERVALO', 10)
+
+
+def _max_pendentes():
+    return getattr(settings, 'PROGRESSO_MAX_PENDENTES', 5000)
+
+
+def _mesclar(destino, chave, posicao, duracao):
+    atual = destino.get(chave)
+    if atual is None:
+        destino[chave] = [posicao, duracao]
+        return
+    atual[0] = max(atual[0], posicao)
+    if duracao:
+        atual[1] = max(atual[1] or 0, duracao)
+
+
+def calcular_percentual(posicao, duracao):
+    if not duracao:
+        return 0.0
+    return round(min(posicao / duracao, 1.0) * 100, 2)
+
+
+def _loop_flush():
+    while True:
+        time.sleep(max(_intervalo(), 1))
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Falha no flush periódico de progresso")
+        finally:
+            close_old_connections()
+
+
+def _iniciar_flusher():
+    """Garante uma thread de flush periódico por processo (o pid cobre workers criados por fork)."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_loop_flush, name='progresso-flush', daemon=True).start()
+
+
+def registrar(user_id, heartbeats):
+    """Acumula heartbeats ({video, posicao, duracao}) e faz flush se o intervalo venceu."""
+    with _lock:
+        _iniciar_flusher()
+        for hb in heartbeats:
+            _mesclar(_pendentes, (user_id, hb['video']), hb['posicao'], hb.get('duracao'))
+        vencido = (
+            time.monotonic() - _ultimo_flush >= _intervalo()
+            or len(_pendentes) >= _max_pendentes()
+        )
+    if vencido:
+        flush()
+
+
+def flush():
+    global _pendentes, _ultimo_flush
+    with _lock:
+        lote, _pendentes = _pendentes, {}
+        _ultimo_flush = time.monotonic()
+
+    if not lote:
+        return 0
+
+    try:
+        return _gravar(lote)
+    except DatabaseError:
+        logger.exception("Falha ao gravar progresso em lote; tentando par a par")
+
+    # Um par ruim não pode travar o lote inteiro: erros de integridade descartam só o par,
+    # outros erros de banco (conexão, lock) devolvem o par para o próximo flush
+    gravados = 0
+    for chave, valores in lote.items():
+        try:
+            gravados += _gravar({chave: valores})
+        except IntegrityError:
+            logger.warning("Progresso descartado para %s: erro de integridade", chave)
+        except DatabaseError:
+            with _lock:
+                _mesclar(_pendentes, chave, *valores)
+    return gravados
+
+
+def _gravar(lote):
+    user_ids = {user_id for user_id, _ in lote}
+    video_ids = {video_id for _, video_id in lote}
+
+    # Vídeos e usuários inexistentes (apagados com heartbeats pendentes) são descartados aqui
+    user_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    duracoes_video = {
+        video_id: duracao.total_seconds() if duracao else None
+        for video_id, duracao in Video.objects.filter(id__in=video_ids).values_list('id', 'duracao')
+    }
+
+    with transaction.atomic():
+        existentes = {
+            (p.user_id, p.video_id): p
+            for p in VideoProgress.objects.select_for_update().filter(
+                user_id__in=user_ids, video_id__in=video_ids
+            )
+        }
+
+        objetos = []
+        for (user_id, video_id), (posicao, duracao) in lote.items():
+            if video_id not in duracoes_video or user_id not in user_ids:
+                continue
+
+            existente = existentes.get((user_id, video_id))
+            if existente:
+                posicao = max(posicao, existente.posicao_maxima)
+                duracao = duracao or existente.duracao
+            duracao = duracao or duracoes_video[video_id]
+
+            objetos.append(VideoProgress(
+                user_id=user_id,
+                video_id=video_id,
+                posicao_maxima=posicao,
+                duracao=duracao,
+                percentual=calcular_percentual(posicao, duracao),
+            ))
+
+        VideoProgress.objects.bulk_create(
+            objetos,
+            update_conflicts=True,
+            unique_fields=['user', 'video'],
+            update_fields=['posicao_maxima', 'duracao', 'percentual', 'updated_at'],
+        )
+
+    return len(objetos)
+
+
+def progresso_do_usuario(user_id, video_id=None):
+    """Lê o progresso já gravado e sobrepõe o que ainda está no buffer deste processo."""
+    registros = VideoProgress.objects.filter(user_id=user_id)
+    if video_id is not None:
+        registros = registros.filter(video_id=video_id)
+
+    resultado = {
+        r['video']: r
+        for r in registros.values('video', 'posicao_maxima', 'duracao', 'percentual', 'updated_at')
+    }
+
+    with _lock:
+        pendentes = {
+            vid: valores for (uid, vid), valores in _pendentes.items()
+            if uid == user_id and (video_id is None or vid == video_id)
+        }
+
+    for vid, (posicao, duracao) in pendentes.items():
+        atual = resultado.get(vid)
+        if atual is None:
+            resultado[vid] = {
+                'video': vid,
+                'posicao_maxima': posicao,
+                'duracao': duracao,
+                'percentual': calcular_percentual(posicao, duracao),
+                'updated_at': None,
+            }
+        elif posicao > atual['posicao_maxima']:
+            atual['posicao_maxima'] = posicao
+            atual['duracao'] = duracao or atual['duracao']
+            atual['percentual'] = calcular_percentual(posicao, atual['duracao'])
+
+    return list(resultado.values())
+
+
+# Não perder o que estiver no buffer quando o worker for encerrado
+atexit.register(flush)
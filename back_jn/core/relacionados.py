@@ -0,0 +1,299 @@
+import logging
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Video, VideoRelacionados
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Recomendações de vídeos relacionados por TF-IDF das transcrições.
+#
+# O índice fica em um diretório: vocabulario.npz (termos e idf, só muda no construir_indice) e
+# ids.npy, minimos.npy e matriz.npy, alocados com folga e abertos com mmap. Incluir um vídeo
+# escreve só a linha dele no lugar; os arquivos só são realocados quando a folga acaba (dobrando).
+# Os top-k de cada vídeo são calculados em blocos com produto de matrizes e gravados em
+# VideoRelacionados, então a leitura não depende do tamanho do acervo.
+
+STOPWORDS = set("""
+a ao aos aquela aquelas aquele aqueles aquilo as até com como da das de dela delas dele deles
+depois do dos e ela elas ele eles em entre era eram essa essas esse esses esta estas este estes
+eu foi for foram há isso isto já lhe lhes mais mas me mesmo meu minha muito na nas nem no nos
+nossa nosso num numa não o os ou para pela pelas pelo pelos por qual quando que quem se sem ser
+seu sua são só também te tem tinha tu tua um uma umas uns você vocês vai vamos então aqui aí
+""".split())
+
+_TOKEN = re.compile(r"[^\W\d_]{3,}")
+
+
+def _diretorio():
+    return str(getattr(settings, 'RELACIONADOS_INDICE', settings.BASE_DIR / 'indice_relacionados'))
+
+
+def _arquivo(nome):
+    return os.path.join(_diretorio(), nome)
+
+
+def _top_k():
+    return getattr(settings, 'RELACIONADOS_TOP_K', 10)
+
+
+def _texto(transcricao):
+    try:
+        return transcricao['results']['transcripts'][0]['transcript']
+    except (TypeError, KeyError, IndexError):
+        return ""
+
+
+def _tokens(texto):
+    return [t for t in _TOKEN.findall(texto.lower()) if t not in STOPWORDS]
+
+
+def _vetorizar(tokens, vocab, idf):
+    vetor = np.zeros(len(vocab), dtype=np.float32)
+    for termo, contagem in Counter(tokens).items():
+        coluna = vocab.get(termo)
+        if coluna is not None:
+            vetor[coluna] = (1 + math.log(contagem)) * idf[coluna]
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
+
+
+def _transcricoes():
+    return Video.objects.filter(transcricao__isnull=False).order_by('id').values_list('id', 'transcricao').iterator(chunk_size=50)
+
+
+def _vizinhos_em_blocos(matriz, k, bloco=256):
+    """Top-k por linha de matriz @ matriz.T, processando `bloco` linhas por vez para limitar a memória."""
+    n = len(matriz)
+    k = min(k, n - 1)
+    indices = np.empty((n, max(k, 0)), dtype=np.int64)
+    scores = np.empty((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+
+    for inicio in range(0, n, bloco):
+        fim = min(inicio + bloco, n)
+        similaridades = matriz[inicio:fim] @ matriz.T
+        linhas = np.arange(fim - inicio)
+        similaridades[linhas, inicio + linhas] = -1  # o próprio vídeo não conta
+
+        candidatos = np.argpartition(-similaridades, k - 1, axis=1)[:, :k]
+        candidatos_scores = np.take_along_axis(similaridades, candidatos, axis=1)
+        ordem = np.argsort(-candidatos_scores, axis=1)
+        indices[inicio:fim] = np.take_along_axis(candidatos, ordem, axis=1)
+        scores[inicio:fim] = np.take_along_axis(candidatos_scores, ordem, axis=1)
+
+    return indices, scores
+
+
+def _lista_vizinhos(ids, indices, scores):
+    return [
+        {"video": int(ids[i]), "score": round(float(s), 4)}
+        for i, s in zip(indices, scores) if s > 0
+    ]
+
+
+def _minimos(scores, k):
+    """Score do k-ésimo vizinho de cada linha (-1 se ainda tem menos de k): o piso para entrar na lista."""
+    minimos = np.full(len(scores), -1, dtype=np.float32)
+    if scores.shape[1] == k:
+        minimos[:] = scores[:, -1]
+    return minimos
+
+
+def _gravar_vizinhos(por_video):
+    objetos = [VideoRelacionados(video_id=video_id, vizinhos=vizinhos) for video_id, vizinhos in por_video.items()]
+    VideoRelacionados.objects.bulk_create(
+        objetos,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['video'],
+        update_fields=['vizinhos', 'atualizado_em'],
+    )
+
+
+def _abrir(nome, modo='r+'):
+    return np.load(_arquivo(nome), mmap_mode=modo)
+
+
+def _criar(nome, dtype, shape, preencher=None):
+    """Cria um .npy temporário em mmap; _publicar() coloca no lugar do definitivo."""
+    array = np.lib.format.open_memmap(_arquivo(f"{nome}.tmp"), mode='w+', dtype=dtype, shape=shape)
+    if preencher is not None:
+        array[:] = preencher
+    return array
+
+
+def _publicar(*nomes):
+    for nome in nomes:
+        os.replace(_arquivo(f"{nome}.tmp"), _arquivo(nome))
+
+
+def _capacidade_inicial(total):
+    return max(256, total + total // 4)
+
+
+class _LockIndice:
+    def __enter__(self):
+        os.makedirs(_diretorio(), exist_ok=True)
+        self._arquivo = open(_arquivo('indice.lock'), 'w')
+        if fcntl:
+            fcntl.flock(self._arquivo, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if fcntl:
+            fcntl.flock(self._arquivo, fcntl.LOCK_UN)
+        self._arquivo.close()
+
+
+def construir_indice():
+    """Recalcula o índice inteiro e os vizinhos de todos os vídeos com transcrição."""
+    max_termos = getattr(settings, 'RELACIONADOS_MAX_TERMOS', 2048)
+    k = _top_k()
+
+    # 1ª passada: frequência de documento, sem guardar os textos
+    df = Counter()
+    total = 0
+    for _, transcricao in _transcricoes():
+        df.update(set(_tokens(_texto(transcricao))))
+        total += 1
+
+    termos = [termo for termo, _ in df.most_common(max_termos)]
+    vocab = {termo: i for i, termo in enumerate(termos)}
+    idf = np.array([math.log((1 + total) / (1 + df[t])) + 1 for t in termos], dtype=np.float32)
+
+    with _LockIndice():
+        # 2ª passada: matriz TF-IDF (linhas normalizadas, produto escalar = cosseno) escrita direto no arquivo
+        capacidade = _capacidade_inicial(total)
+        ids = _criar('ids.npy', np.int64, (capacidade,), preencher=-1)
+        matriz = _criar('matriz.npy', np.float32, (capacidade, len(termos)), preencher=0)
+        preenchidas = 0
+        for video_id, transcricao in _transcricoes():
+            if preenchidas == total:
+                break  # transcrito entre as passadas; entra depois pelo atualizar_video
+            ids[preenchidas] = video_id
+            matriz[preenchidas] = _vetorizar(_tokens(_texto(transcricao)), vocab, idf)
+            preenchidas += 1
+
+        indices, scores = _vizinhos_em_blocos(matriz[:preenchidas], k)
+        minimos = _criar('minimos.npy', np.float32, (capacidade,), preencher=-1)
+        minimos[:preenchidas] = _minimos(scores, k)
+
+        for array in (ids, matriz, minimos):
+            array.flush()
+        del ids, matriz, minimos
+        np.savez(_arquivo('vocabulario.tmp.npz'), termos=np.array(termos, dtype=str), idf=idf)
+        _publicar('ids.npy', 'matriz.npy', 'minimos.npy')
+        os.replace(_arquivo('vocabulario.tmp.npz'), _arquivo('vocabulario.npz'))
+
+        ids = _abrir('ids.npy', 'r')[:preenchidas]
+        with transaction.atomic():
+            VideoRelacionados.objects.exclude(video_id__in=ids.tolist()).delete()
+            _gravar_vizinhos({
+                int(ids[i]): _lista_vizinhos(ids, indices[i], scores[i]) for i in range(preenchidas)
+            })
+
+    return preenchidas
+
+
+def _crescer(capacidade):
+    """Realoca os arquivos com mais folga. Só acontece quando a folga acaba, e a capacidade dobra."""
+    ids, matriz, minimos = _abrir('ids.npy', 'r'), _abrir('matriz.npy', 'r'), _abrir('minimos.npy', 'r')
+    n = len(ids)
+    novos_ids = _criar('ids.npy', np.int64, (capacidade,), preencher=-1)
+    novos_minimos = _criar('minimos.npy', np.float32, (capacidade,), preencher=-1)
+    nova_matriz = _criar('matriz.npy', np.float32, (capacidade, matriz.shape[1]), preencher=0)
+    novos_ids[:n] = ids
+    novos_minimos[:n] = minimos
+    for inicio in range(0, n, 4096):
+        fim = min(inicio + 4096, n)
+        nova_matriz[inicio:fim] = matriz[inicio:fim]
+    for array in (novos_ids, novos_minimos, nova_matriz):
+        array.flush()
+    del ids, matriz, minimos, novos_ids, novos_minimos, nova_matriz
+    _publicar('ids.npy', 'matriz.npy', 'minimos.npy')
+
+
+def atualizar_video(video_id, transcricao):
+    """
+    Inclui (ou substitui) um vídeo no índice sem recalcular tudo.
+
+    Usa o vocabulário e o idf atuais; grava só a linha do vídeo na matriz, calcula os vizinhos
+    dele com um único produto matriz-vetor e só reescreve as listas dos vídeos em que ele passa
+    a ficar no top-k. O construir_indice periódico corrige o desvio de idf e entradas antigas
+    que saíram do top-k. Chamado fora da requisição, via core/tarefas.py.
+    """
+    with _LockIndice():
+        if os.path.exists(_arquivo('vocabulario.npz')):
+            _incluir_no_indice(video_id, transcricao)
+            return
+
+    # Ainda não existe índice: o primeiro é construído por completo
+    construir_indice()
+
+
+def _incluir_no_indice(video_id, transcricao):
+    k = _top_k()
+    with np.load(_arquivo('vocabulario.npz')) as vocabulario:
+        vocab = {termo: i for i, termo in enumerate(vocabulario['termos'].tolist())}
+        idf = vocabulario['idf']
+    vetor = _vetorizar(_tokens(_texto(transcricao)), vocab, idf)
+
+    ids = _abrir('ids.npy')
+    n = int(np.count_nonzero(ids >= 0))
+    posicoes = np.flatnonzero(ids[:n] == video_id)
+    if len(posicoes):
+        posicao = int(posicoes[0])
+    else:
+        posicao = n
+        n += 1
+        if n > len(ids):
+            del ids
+            _crescer(2 * (n - 1))
+            ids = _abrir('ids.npy')
+
+    matriz, minimos = _abrir('matriz.npy'), _abrir('minimos.npy')
+    # A linha é gravada antes do id: se o processo cair no meio, a posição continua livre
+    matriz[posicao] = vetor
+    matriz.flush()
+    ids[posicao] = video_id
+    ids.flush()
+
+    ids, minimos_ativos = ids[:n], minimos[:n]
+    similaridades = matriz[:n] @ vetor
+    similaridades[posicao] = -1
+
+    n_vizinhos = min(k, n - 1)
+    vizinhos = np.argsort(-similaridades)[:n_vizinhos]
+    por_video = {video_id: _lista_vizinhos(ids, vizinhos, similaridades[vizinhos])}
+    minimos_ativos[posicao] = similaridades[vizinhos[-1]] if n_vizinhos == k and k > 0 else -1
+
+    # Vídeos em que o novo supera o k-ésimo vizinho atual
+    afetados = np.flatnonzero((similaridades > minimos_ativos) & (similaridades > 0))
+    afetados = afetados[afetados != posicao]
+    atuais = dict(
+        VideoRelacionados.objects.filter(video_id__in=ids[afetados].tolist()).values_list('video_id', 'vizinhos')
+    )
+    for linha in afetados:
+        outro = int(ids[linha])
+        lista = [v for v in atuais.get(outro, []) if v['video'] != video_id]
+        lista.append({"video": video_id, "score": round(float(similaridades[linha]), 4)})
+        lista = sorted(lista, key=lambda v: -v['score'])[:k]
+        por_video[outro] = lista
+        if len(lista) == k:
+            minimos_ativos[linha] = lista[-1]['score']
+
+    minimos.flush()
+    _gravar_vizinhos(por_video)
@@ -0,0 +1,45 @@
+import gzip
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+def evento_sse(evento, dados):
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite negociar text/event-stream nas actions que respondem com StreamingHttpResponse.
+
+    Respostas comuns dessas actions (400, 429, replays de idempotência) viram um único
+    evento: 'erro' para status >= 400 e 'resposta' para os demais.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        evento = 'erro' if response is not None and response.status_code >= 400 else 'resposta'
+        return evento_sse(evento, data).encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Negociação de application/x-ndjson; respostas comuns (erros) viram uma linha JSON."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # utf-8 fixo: a subclasse gzip não declara charset (o corpo é binário)
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class NDJSONGzipRenderer(NDJSONRenderer):
+    media_type = 'application/gzip'
+    format = 'ndjson.gz'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return gzip.compress(super().render(data, accepted_media_type, renderer_context))
@@ -45,4 +45,11 @@ class ProfileSerializer(serializers.ModelSerializer):
 class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+# Heartbeat enviado pelo player; posicao e duracao em segundos
+class HeartbeatSerializer(serializers.Serializer):
+    video = serializers.IntegerField(min_value=1)
+    posicao = serializers.FloatField(min_value=0)
+    duracao = serializers.FloatField(min_value=0, required=False, allow_null=True)
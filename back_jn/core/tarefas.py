@@ -0,0 +1,62 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import User, Video, Quiz
+from .utils import start_transcription_job, generate_quiz_gpt, parse_quiz_json
+
+logger = logging.getLogger(__name__)
+
+# Fila de tarefas em segundo plano para as ações em massa do admin.
+# Roda em threads do próprio processo: a requisição do admin só enfileira os ids e retorna.
+# Tarefas pendentes se perdem se o worker reiniciar; podem ser reenviadas pela mesma ação.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'TAREFAS_WORKERS', 2),
+    thread_name_prefix='tarefas',
+)
+
+
+def _executar(funcao, *args):
+    close_old_connections()
+    try:
+        funcao(*args)
+    except Exception:
+        logger.exception("Tarefa %s%s falhou", funcao.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def enfileirar(funcao, *args):
+    return _executor.submit(_executar, funcao, *args)
+
+
+def regenerar_quiz(video_id):
+    transcricao = Video.objects.filter(pk=video_id).values_list('transcricao', flat=True).first()
+    if not transcricao:
+        logger.warning("Vídeo %s sem transcrição; quiz não regenerado", video_id)
+        return
+
+    quiz_raw = generate_quiz_gpt(transcricao['results']['transcripts'][0]['transcript'])
+    Quiz.objects.update_or_create(video_id=video_id, defaults={'perguntas': parse_quiz_json(quiz_raw)})
+
+
+def retranscrever_video(video_id):
+    from . import relacionados
+
+    link = Video.objects.filter(pk=video_id).values_list('link', flat=True).first()
+    if not link:
+        return
+
+    transcricao_json = start_transcription_job(link)
+    if not transcricao_json:
+        logger.warning("Transcrição do vídeo %s falhou", video_id)
+        return
+
+    Video.objects.filter(pk=video_id).update(transcricao=transcricao_json)
+    relacionados.atualizar_video(video_id, transcricao_json)
+
+
+def desativar_usuarios(user_ids):
+    User.objects.filter(pk__in=user_ids).update(is_active=False)
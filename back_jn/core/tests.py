@@ -1,3 +1,595 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import User, Profile, Video, Quiz, ThrottleBucket, IdempotencyKey, VideoRelacionados, VideoProgress
+from . import progresso, relacionados, tarefas
+from .throttling import consumir
+from .utils import QuizStreamParser
+
+TRANSCRICAO = {'results': {'transcripts': [{'transcript': 'conteúdo do treinamento'}]}}
+
+
+@override_settings(PROGRESSO_FLUSH_INTERVALO=3600)
+class ProgressoTests(TestCase):
+    def setUp(self):
+        progresso._pendentes.clear()
+        progresso._ultimo_flush = time.monotonic()
+        self.addCleanup(progresso._pendentes.clear)
+        self.user = User.objects.create_user('aluno', '123', 'senha')
+        self.video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4')
+
+    def test_buffer_mantem_o_maximo_por_usuario_e_video(self):
+        progresso.registrar(self.user.id, [
+            {'video': self.video.id, 'posicao': 30, 'duracao': 100},
+            {'video': self.video.id, 'posicao': 10, 'duracao': None},
+        ])
+        self.assertEqual(progresso._pendentes, {(self.user.id, self.video.id): [30, 100]})
+        self.assertFalse(VideoProgress.objects.exists())
+
+    def test_flush_mantem_o_maior_entre_banco_e_buffer(self):
+        VideoProgress.objects.create(user=self.user, video=self.video, posicao_maxima=50, duracao=100, percentual=50)
+
+        progresso.registrar(self.user.id, [{'video': self.video.id, 'posicao': 30}])
+        self.assertEqual(progresso.flush(), 1)
+        self.assertEqual(VideoProgress.objects.get().posicao_maxima, 50)
+
+        progresso.registrar(self.user.id, [{'video': self.video.id, 'posicao': 80}])
+        progresso.flush()
+        registro = VideoProgress.objects.get()
+        self.assertEqual((registro.posicao_maxima, registro.duracao, registro.percentual), (80, 100, 80.0))
+
+    def test_descarta_video_e_usuario_inexistentes(self):
+        progresso.registrar(self.user.id, [{'video': self.video.id + 1, 'posicao': 10}])
+        progresso.registrar(self.user.id + 1, [{'video': self.video.id, 'posicao': 10}])
+        progresso.registrar(self.user.id, [{'video': self.video.id, 'posicao': 10}])
+
+        self.assertEqual(progresso.flush(), 1)
+        self.assertEqual(list(VideoProgress.objects.values_list('user', 'video')), [(self.user.id, self.video.id)])
+        self.assertEqual(progresso._pendentes, {})
+
+    def test_falha_no_lote_grava_par_a_par_e_devolve_so_os_pares_com_erro_de_banco(self):
+        outro = Video.objects.create(titulo='w', link='https://exemplo.com/w.mp4')
+        terceiro = Video.objects.create(titulo='x', link='https://exemplo.com/x.mp4')
+        gravar = progresso._gravar
+        erros = {outro.id: IntegrityError, terceiro.id: DatabaseError}
+
+        def _gravar(lote):
+            if len(lote) > 1:
+                raise DatabaseError('lote')
+            (_, video_id), = lote
+            if video_id in erros:
+                raise erros[video_id](str(video_id))
+            return gravar(lote)
+
+        progresso.registrar(self.user.id, [
+            {'video': video_id, 'posicao': 10} for video_id in (self.video.id, outro.id, terceiro.id)
+        ])
+        with mock.patch('core.progresso._gravar', side_effect=_gravar), self.assertLogs('core.progresso'):
+            self.assertEqual(progresso.flush(), 1)
+
+        self.assertEqual(list(VideoProgress.objects.values_list('video', flat=True)), [self.video.id])
+        self.assertEqual(progresso._pendentes, {(self.user.id, terceiro.id): [10, None]})
+
+    def test_leitura_sobrepoe_o_buffer_aos_registros_gravados(self):
+        outro = Video.objects.create(titulo='w', link='https://exemplo.com/w.mp4')
+        VideoProgress.objects.create(user=self.user, video=self.video, posicao_maxima=50, duracao=100, percentual=50)
+        progresso.registrar(self.user.id, [
+            {'video': self.video.id, 'posicao': 70},
+            {'video': outro.id, 'posicao': 20, 'duracao': 40},
+        ])
+
+        registros = {r['video']: r for r in progresso.progresso_do_usuario(self.user.id)}
+        self.assertEqual((registros[self.video.id]['posicao_maxima'], registros[self.video.id]['percentual']), (70, 70.0))
+        self.assertEqual((registros[outro.id]['percentual'], registros[outro.id]['updated_at']), (50.0, None))
+        self.assertEqual(len(progresso.progresso_do_usuario(self.user.id, video_id=outro.id)), 1)
+
+    def test_api_de_progresso(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post('/api/progresso/', {'video': self.video.id, 'posicao': 12, 'duracao': 60}, format='json')
+        self.assertEqual((response.status_code, response.data), (202, {'recebidos': 1}))
+        response = client.post('/api/progresso/', [{'video': self.video.id, 'posicao': 30}] * 2, format='json')
+        self.assertEqual((response.status_code, response.data), (202, {'recebidos': 2}))
+        response = client.post('/api/progresso/', [{'video': self.video.id, 'posicao': 1}] * 501, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = client.get(f'/api/videos/{self.video.id}/progresso/')
+        self.assertEqual((response.data['posicao_maxima'], response.data['percentual']), (30, 50.0))
+        self.assertEqual(len(client.get('/api/progresso/').data), 1)
+
+        self.assertEqual(client.get('/api/videos/abc/progresso/').status_code, 404)
+        self.assertEqual(client.get(f'/api/videos/{self.video.id + 1}/progresso/').status_code, 404)
+
+
+class QuizStreamParserTests(TestCase):
+    def alimentar(self, texto, tamanho):
+        parser = QuizStreamParser()
+        objetos = []
+        for i in range(0, len(texto), tamanho):
+            objetos += parser.feed(texto[i:i + tamanho])
+        return objetos
+
+    def test_objetos_saem_conforme_fecham(self):
+        parser = QuizStreamParser()
+        self.assertEqual(parser.feed('[{"pergunta": "a", "correta"'), [])
+        self.assertEqual(parser.feed(': "a"}, {"pergunta"'), [{"pergunta": "a", "correta": "a"}])
+        self.assertEqual(parser.feed(': "b"}]'), [{"pergunta": "b"}])
+
+    def test_chaves_e_aspas_dentro_de_strings(self):
+        texto = '[{"pergunta": "o que é {x} e \\"y\\"?", "alternativas": ["}", "{"]}]'
+        for tamanho in (1, 3, 7, len(texto)):
+            self.assertEqual(
+                self.alimentar(texto, tamanho),
+                [{"pergunta": 'o que é {x} e "y"?', "alternativas": ["}", "{"]}],
+            )
+
+    def test_ignora_cercas_de_markdown(self):
+        texto = '```json\n[{"pergunta": "a"}]\n```'
+        self.assertEqual(self.alimentar(texto, 4), [{"pergunta": "a"}])
+
+    def test_objeto_invalido_e_descartado(self):
+        self.assertEqual(self.alimentar('[{"pergunta": a}, {"pergunta": "b"}]', 5), [{"pergunta": "b"}])
+
+
+class GerarQuizStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('aluno', '123', 'senha')
+        self.video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4', transcricao=TRANSCRICAO)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/videos/{self.video.id}/gerar-quiz-stream/'
+        resposta_gpt = '[{"pergunta": "p", "alternativas": ["a", "b"], "correta": "a"}]'
+        patcher = mock.patch('core.views.generate_quiz_gpt_stream', return_value=iter([resposta_gpt[:9], resposta_gpt[9:]]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_aceita_text_event_stream(self):
+        response = self.client.post(self.url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        conteudo = b''.join(response.streaming_content).decode()
+        self.assertIn('event: pergunta', conteudo)
+        self.assertIn('event: fim', conteudo)
+        self.assertTrue(Quiz.objects.filter(video=self.video).exists())
+
+    def test_erro_de_validacao_vira_evento_sse(self):
+        Quiz.objects.create(video=self.video, perguntas=[])
+        response = self.client.post(self.url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.startswith(b'event: erro'))
+
+    def test_idempotency_key_duplicada_durante_o_stream(self):
+        response = self.client.post(self.url, HTTP_ACCEPT='text/event-stream', HTTP_IDEMPOTENCY_KEY='k')
+        duplicada = self.client.post(self.url, HTTP_ACCEPT='text/event-stream', HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual(duplicada.status_code, 409)
+
+        b''.join(response.streaming_content)
+        replay = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+
+class ConsumirTests(TestCase):
+    def test_consome_ate_esvaziar_e_informa_espera(self):
+        demandas = [('t:global:requisicoes', 2, 2 / 60, 1)]
+        with mock.patch('core.throttling.time.time', return_value=1000.0):
+            self.assertIsNone(consumir(demandas))
+            self.assertIsNone(consumir(demandas))
+            self.assertAlmostEqual(consumir(demandas), 30)
+        self.assertEqual(ThrottleBucket.objects.get(chave='t:global:requisicoes').rejeicoes, 1)
+
+    def test_reposicao_proporcional_ao_tempo(self):
+        demandas = [('t:global:requisicoes', 2, 2 / 60, 2)]
+        with mock.patch('core.throttling.time.time', return_value=1000.0):
+            self.assertIsNone(consumir(demandas))
+        with mock.patch('core.throttling.time.time', return_value=1030.0):
+            self.assertAlmostEqual(consumir(demandas), 30)
+        with mock.patch('core.throttling.time.time', return_value=1060.0):
+            self.assertIsNone(consumir(demandas))
+
+    def test_rejeicao_nao_consome_dos_outros_buckets(self):
+        cheio = ('t:user:1:tokens', 100, 1, 10)
+        vazio = ('t:global:tokens', 5, 1, 10)
+        with mock.patch('core.throttling.time.time', return_value=1000.0):
+            self.assertAlmostEqual(consumir([cheio, vazio]), 5)
+        self.assertEqual(ThrottleBucket.objects.get(chave='t:user:1:tokens').tokens, 100)
+
+
+@override_settings(THROTTLE_TOKEN_BUCKETS={
+    'gerar-quiz': {'usuario': {'requisicoes': '10/h', 'tokens': '10000/h'}},
+})
+class GerarQuizThrottleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('aluno', '123', 'senha')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tokens(self):
+        return ThrottleBucket.objects.get(chave=f'gerar-quiz:user:{self.user.pk}:tokens').tokens
+
+    def test_tokens_devolvidos_quando_a_validacao_falha(self):
+        video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4')
+        response = self.client.post(f'/api/videos/{video.id}/gerar-quiz/')
+        self.assertEqual(response.status_code, 400)
+        self.assertAlmostEqual(self.tokens(), 10000, places=0)
+        self.assertLess(ThrottleBucket.objects.get(chave=f'gerar-quiz:user:{self.user.pk}:requisicoes').tokens, 10)
+
+    def test_tokens_cobrados_pelo_tamanho_da_transcricao(self):
+        texto = 'x' * 4000
+        video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4',
+                                     transcricao={'results': {'transcripts': [{'transcript': texto}]}})
+        with mock.patch('core.views.generate_quiz_gpt', return_value='[]'):
+            self.client.post(f'/api/videos/{video.id}/gerar-quiz/')
+        self.assertAlmostEqual(self.tokens(), 10000 - 1000 - 800, places=0)
+
+    @override_settings(IDEMPOTENCIA_INTERVALO_POLL=0.05)
+    def test_replay_nao_e_cobrado_mas_registro_assumido_e(self):
+        video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4', transcricao=TRANSCRICAO)
+        url = f'/api/videos/{video.id}/gerar-quiz/'
+        resposta_gpt = '[{"pergunta": "p", "alternativas": ["a", "b"], "correta": "a"}]'
+
+        with mock.patch('core.throttling.time.time', return_value=1000.0), \
+                mock.patch('core.views.generate_quiz_gpt', return_value=resposta_gpt) as gerar:
+            self.client.post(url, HTTP_IDEMPOTENCY_KEY='k')
+            cobrado = 10000 - self.tokens()
+            replay = self.client.post(url, HTTP_IDEMPOTENCY_KEY='k')
+            self.assertEqual(replay['Idempotent-Replayed'], 'true')
+            self.assertAlmostEqual(self.tokens(), 10000 - cobrado)
+
+            Quiz.objects.all().delete()
+            IdempotencyKey.objects.update(status='em_andamento', atualizado_em=timezone.now() - timedelta(hours=1))
+            response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='k')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(gerar.call_count, 2)
+        self.assertAlmostEqual(self.tokens(), 10000 - 2 * cobrado)
+
+
+@override_settings(THROTTLE_TOKEN_BUCKETS={}, IDEMPOTENCIA_INTERVALO_POLL=0.05)
+class IdempotenciaTests(TestCase):
+    resposta_gpt = '[{"pergunta": "p", "alternativas": ["a", "b"], "correta": "a"}]'
+
+    def setUp(self):
+        self.user = User.objects.create_user('aluno', '123', 'senha')
+        self.video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4', transcricao=TRANSCRICAO)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/videos/{self.video.id}/gerar-quiz/'
+
+    def post(self, chave='k', **dados):
+        return self.client.post(self.url, dados, format='json', HTTP_IDEMPOTENCY_KEY=chave)
+
+    def test_duplicada_recebe_replay_sem_refazer_o_trabalho(self):
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt) as gerar:
+            primeira = self.post()
+            segunda = self.post()
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda.data, primeira.data)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+
+    def test_mesma_chave_com_outro_corpo_retorna_422(self):
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt):
+            self.post(titulo='a')
+            response = self.post(titulo='b')
+        self.assertEqual(response.status_code, 422)
+
+    def test_erro_5xx_libera_a_chave(self):
+        with mock.patch('core.views.generate_quiz_gpt', side_effect=RuntimeError('fora do ar')):
+            self.assertEqual(self.post().status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt):
+            self.assertEqual(self.post().status_code, 201)
+
+    def test_excecao_libera_a_chave(self):
+        with mock.patch('core.views.VideoViewSet.get_object', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.post()
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(IDEMPOTENCIA_ESPERA_MAXIMA=0.1)
+    def test_duplicada_de_requisicao_em_andamento_recebe_409(self):
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt):
+            self.post()
+        IdempotencyKey.objects.update(status='em_andamento')
+        response = self.post()
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Retry-After', response)
+
+    def test_registro_em_andamento_abandonado_e_assumido(self):
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt):
+            self.post()
+        Quiz.objects.all().delete()
+        IdempotencyKey.objects.update(status='em_andamento', atualizado_em=timezone.now() - timedelta(hours=1))
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt) as gerar:
+            response = self.post()
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'concluido')
+
+    def test_chaves_expiradas_sao_apagadas(self):
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt):
+            self.post('antiga')
+        IdempotencyKey.objects.update(criado_em=timezone.now() - timedelta(days=2))
+        Quiz.objects.all().delete()
+        with mock.patch('core.views.generate_quiz_gpt', return_value=self.resposta_gpt) as gerar:
+            self.post('antiga')
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+@override_settings(THROTTLE_TOKEN_BUCKETS={}, IDEMPOTENCIA_INTERVALO_POLL=0.05)
+class IdempotenciaConcorrenciaTests(TransactionTestCase):
+    def test_duplicadas_concorrentes_executam_uma_vez(self):
+        user = User.objects.create_user('aluno', '123', 'senha')
+        video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4', transcricao=TRANSCRICAO)
+
+        def gerar_devagar(texto):
+            time.sleep(0.5)
+            return '[{"pergunta": "p", "alternativas": ["a", "b"], "correta": "a"}]'
+
+        respostas = []
+
+        def enviar():
+            client = APIClient()
+            client.force_authenticate(user)
+            respostas.append(client.post(f'/api/videos/{video.id}/gerar-quiz/', HTTP_IDEMPOTENCY_KEY='k'))
+            connection.close()
+
+        with mock.patch('core.views.generate_quiz_gpt', side_effect=gerar_devagar) as gerar:
+            threads = [threading.Thread(target=enviar) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(sorted(r.status_code for r in respostas), [201, 201, 201])
+        self.assertEqual(Quiz.objects.count(), 1)
+
+
+class CatalogoTests(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(titulo='v', link='https://exemplo.com/v.mp4', transcricao=TRANSCRICAO,
+                                          duracao=timedelta(minutes=3))
+        self.quiz = Quiz.objects.create(video=self.video, perguntas=[{"pergunta": "p"}])
+        antigo = timezone.now() - timedelta(days=30)
+        Video.objects.update(created_at=antigo, updated_at=antigo)
+        Quiz.objects.update(criado_em=antigo)
+        self.antigo = antigo
+
+        diretorio = tempfile.mkdtemp()
+        patcher = override_settings(RELACIONADOS_INDICE=os.path.join(diretorio, 'indice'))
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.arquivo = os.path.join(diretorio, 'catalogo.ndjson.gz')
+        call_command('exportar_catalogo', '--gzip', '--saida', self.arquivo)
+
+    def test_importacao_preserva_datas_e_remove_checkpoint(self):
+        Video.objects.all().delete()
+        call_command('importar_catalogo', self.arquivo, '--lote', '1', stdout=open(os.devnull, 'w'))
+
+        video = Video.objects.get(id=self.video.id)
+        self.assertEqual(video.created_at, self.antigo)
+        self.assertEqual(video.updated_at, self.antigo)
+        self.assertEqual(video.duracao, timedelta(minutes=3))
+        self.assertEqual(video.transcricao, TRANSCRICAO)
+        self.assertEqual(Quiz.objects.get(video=video).criado_em, self.antigo)
+        self.assertFalse(os.path.exists(f'{self.arquivo}.checkpoint'))
+
+    def test_exportacao_negocia_ndjson(self):
+        admin = User.objects.create_user('admin', '1', 'senha')
+        admin.is_staff = True
+        admin.save()
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.get('/api/catalogo/exportar/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+        response = client.get('/api/catalogo/exportar/', HTTP_ACCEPT='application/gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn(b'"tipo": "quiz"', gzip.decompress(b''.join(response.streaming_content)))
+
+    def test_erro_da_exportacao_em_gzip(self):
+        admin = User.objects.create_user('admin', '1', 'senha')
+        admin.is_staff = True
+        admin.save()
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.get('/api/catalogo/exportar/?tipos=nada', HTTP_ACCEPT='application/gzip')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'erro', gzip.decompress(response.content))
+
+        response = APIClient().get('/api/catalogo/exportar/', HTTP_ACCEPT='application/gzip')
+        self.assertIn(response.status_code, (401, 403))
+        gzip.decompress(response.content)
+
+
+class RelacionadosTests(TestCase):
+    temas = {
+        'seguranca': 'capacete luva proteção segurança andaime altura cinto',
+        'concreto': 'concreto cimento betoneira areia brita traço laje',
+    }
+
+    def setUp(self):
+        diretorio = tempfile.mkdtemp()
+        patcher = override_settings(RELACIONADOS_INDICE=diretorio, RELACIONADOS_TOP_K=2)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def transcricao(self, tema, i):
+        palavras = self.temas[tema].split()
+        texto = ' '.join(palavras[(i + j) % len(palavras)] for j in range(20))
+        return {'results': {'transcripts': [{'transcript': texto}]}}
+
+    def criar(self, tema, i):
+        return Video.objects.create(titulo=f'{tema}-{i}', link='https://exemplo.com/v.mp4',
+                                    transcricao=self.transcricao(tema, i))
+
+    def vizinhos(self):
+        return {r.video_id: r.vizinhos for r in VideoRelacionados.objects.all()}
+
+    def test_inclusao_incremental_igual_a_reconstrucao(self):
+        for i in range(4):
+            self.criar('seguranca', i)
+            self.criar('concreto', i)
+        relacionados.construir_indice()
+
+        with mock.patch('core.relacionados._capacidade_inicial', return_value=8):
+            relacionados.construir_indice()
+        # A capacidade acabou: o próximo vídeo força o crescimento dos arquivos
+        novo = self.criar('concreto', 9)
+        relacionados.atualizar_video(novo.id, novo.transcricao)
+        incremental = self.vizinhos()
+
+        relacionados.construir_indice()
+        # Empates de score podem sair em ordem diferente; os scores têm que bater
+        self.assertEqual([v['score'] for v in incremental[novo.id]], [v['score'] for v in self.vizinhos()[novo.id]])
+        titulos = Video.objects.filter(id__in=[v['video'] for v in incremental[novo.id]]).values_list('titulo', flat=True)
+        self.assertTrue(all(t.startswith('concreto') for t in titulos))
+
+    def test_upload_nao_atualiza_indice_na_requisicao(self):
+        client = APIClient()
+        arquivo = SimpleUploadedFile('v.mp4', b'0' * 10, content_type='video/mp4')
+        with mock.patch('core.views.upload_video_to_s3', return_value='https://exemplo.com/v.mp4'), \
+                mock.patch('core.views.start_transcription_job', return_value=TRANSCRICAO), \
+                mock.patch('core.views.tarefas.enfileirar') as enfileirar, \
+                mock.patch('core.relacionados.atualizar_video') as atualizar:
+            response = client.post('/api/upload-video/', {'video': arquivo}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        atualizar.assert_not_called()
+        self.assertIs(enfileirar.call_args[0][0], atualizar)
+
+    def test_id_invalido_retorna_404(self):
+        self.assertEqual(APIClient().get('/api/videos/abc/relacionados/').status_code, 404)
+        self.assertEqual(APIClient().get('/api/videos/999/relacionados/').status_code, 404)
+
+    def test_importacao_do_catalogo_atualiza_o_indice(self):
+        for i in range(2):
+            self.criar('seguranca', i)
+            self.criar('concreto', i)
+        arquivo = os.path.join(tempfile.mkdtemp(), 'catalogo.ndjson')
+        call_command('exportar_catalogo', '--saida', arquivo)
+        Video.objects.all().delete()
+
+        call_command('importar_catalogo', arquivo, stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(self.vizinhos()), 4)
+
+        admin = User.objects.create_user('admin', '1', 'senha')
+        admin.is_staff = True
+        admin.save()
+        client = APIClient()
+        client.force_authenticate(admin)
+        with open(arquivo, 'rb') as f, mock.patch('core.views.tarefas.enfileirar') as enfileirar:
+            response = client.post('/api/catalogo/importar/', {'arquivo': f}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        enfileirar.assert_called_once_with(relacionados.construir_indice)
+
+
+class UserAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', '0', 'senha')
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_cadastro_cria_um_perfil_e_senha_com_hash(self):
+        response = self.client.post('/admin/core/user/add/', {
+            'username': 'instrutor',
+            'matricula': '456',
+            'email': '',
+            'usable_password': 'true',
+            'password1': 'uma-senha-forte-123',
+            'password2': 'uma-senha-forte-123',
+        })
+        self.assertEqual(response.status_code, 302)
+        user = User.objects.get(matricula='456')
+        self.assertTrue(user.check_password('uma-senha-forte-123'))
+        self.assertEqual(Profile.objects.filter(user=user).count(), 1)
+
+        response = self.client.get(f'/admin/core/user/{user.id}/change/')
+        self.assertContains(response, 'profile-0-level')
+        response = self.client.get(f'/admin/core/user/{user.id}/password/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_busca_por_matricula_exata_e_prefixo_do_username(self):
+        User.objects.create_user('maria', '789', 'senha')
+        self.assertContains(self.client.get('/admin/core/user/?q=789'), 'maria')
+        self.assertNotContains(self.client.get('/admin/core/user/?q=78'), 'maria')
+        self.assertContains(self.client.get('/admin/core/user/?q=mar'), 'maria')
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', '0', 'senha')
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def criar_videos(self, quantidade):
+        inicio = Video.objects.count()
+        for i in range(inicio, inicio + quantidade):
+            video = Video.objects.create(titulo=f'v{i}', link='https://exemplo.com/v.mp4', transcricao=TRANSCRICAO,
+                                         legenda='legenda')
+            Quiz.objects.create(video=video, perguntas=[{"pergunta": "p"}])
+            User.objects.create_user(f'aluno{i}', f'1{i}', 'senha')
+
+    def test_listagens_adiam_os_campos_pesados(self):
+        self.criar_videos(2)
+        videos = self.client.get('/admin/core/video/').context['cl'].result_list
+        self.assertTrue({'transcricao', 'legenda'} <= videos[0].get_deferred_fields())
+
+        quizzes = self.client.get('/admin/core/quiz/').context['cl'].result_list
+        self.assertIn('perguntas', quizzes[0].get_deferred_fields())
+        self.assertTrue({'transcricao', 'legenda'} <= quizzes[0].video.get_deferred_fields())
+
+    def test_listagens_com_numero_constante_de_consultas(self):
+        self.criar_videos(2)
+        consultas = {}
+        for url in ('/admin/core/user/', '/admin/core/video/', '/admin/core/quiz/'):
+            with CaptureQueriesContext(connection) as contexto:
+                self.client.get(url)
+            consultas[url] = len(contexto)
+
+        self.criar_videos(5)
+        for url, total in consultas.items():
+            with self.assertNumQueries(total):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_acoes_so_enfileiram(self):
+        self.criar_videos(2)
+        video_ids = list(Video.objects.values_list('id', flat=True))
+        user_ids = list(User.objects.exclude(pk=self.admin.pk).values_list('id', flat=True))
+
+        with mock.patch('core.admin.tarefas.enfileirar') as enfileirar, \
+                mock.patch('core.tarefas.generate_quiz_gpt') as gerar, \
+                mock.patch('core.tarefas.start_transcription_job') as transcrever:
+            for acao in ('regenerar_quiz', 'retranscrever'):
+                self.client.post('/admin/core/video/', {'action': acao, '_selected_action': video_ids})
+            self.client.post('/admin/core/user/', {'action': 'desativar_usuarios', '_selected_action': user_ids})
+
+        gerar.assert_not_called()
+        transcrever.assert_not_called()
+        self.assertEqual(User.objects.filter(pk__in=user_ids, is_active=True).count(), len(user_ids))
+        chamadas = [c.args for c in enfileirar.call_args_list]
+        self.assertCountEqual(chamadas[:-1], [
+            *[(tarefas.regenerar_quiz, video_id) for video_id in video_ids],
+            *[(tarefas.retranscrever_video, video_id) for video_id in video_ids],
+        ])
+        funcao, ids = chamadas[-1]
+        self.assertIs(funcao, tarefas.desativar_usuarios)
+        self.assertCountEqual(ids, user_ids)
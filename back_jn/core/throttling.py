@@ -0,0 +1,173 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.fields.json import KT
+from django.db.models.functions import Length, Least
+from rest_framework.throttling import BaseThrottle
+
+from .idempotencia import chave_registrada
+from .models import ThrottleBucket, Video
+
+logger = logging.getLogger(__name__)
+
+DURACOES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_taxa(taxa):
+    """'10/h' -> (10.0, 3600). Aceita o mesmo formato das taxas do DRF ('10/hour', '10/hora')."""
+    quantidade, periodo = taxa.split('/')
+    return float(quantidade), DURACOES[periodo[0]]
+
+
+def consumir(demandas):
+    """
+    Tenta consumir de todos os buckets de uma vez.
+
+    demandas: lista de (chave, capacidade, reposicao_por_segundo, custo).
+    Retorna None se passou, ou os segundos até haver tokens suficientes.
+    """
+    agora = time.time()
+    chaves = sorted(chave for chave, _, _, _ in demandas)
+
+    with transaction.atomic():
+        ThrottleBucket.objects.bulk_create(
+            [ThrottleBucket(chave=chave, tokens=capacidade, atualizado_em=agora)
+             for chave, capacidade, _, _ in demandas],
+            ignore_conflicts=True,
+        )
+        buckets = {
+            b.chave: b
+            for b in ThrottleBucket.objects.select_for_update().filter(chave__in=chaves).order_by('chave')
+        }
+
+        espera = 0
+        sem_tokens = []
+        for chave, capacidade, reposicao, custo in demandas:
+            bucket = buckets[chave]
+            bucket.tokens = min(capacidade, bucket.tokens + (agora - bucket.atualizado_em) * reposicao)
+            bucket.atualizado_em = agora
+            if bucket.tokens < custo:
+                espera = max(espera, (custo - bucket.tokens) / reposicao)
+                sem_tokens.append(chave)
+
+        if sem_tokens:
+            ThrottleBucket.objects.filter(chave__in=sem_tokens).update(rejeicoes=F('rejeicoes') + 1)
+            logger.warning("Throttling: requisição rejeitada por %s (retry em %.0fs)", ", ".join(sem_tokens), espera)
+            return espera
+
+        for chave, _, _, custo in demandas:
+            buckets[chave].tokens -= custo
+        ThrottleBucket.objects.bulk_update(buckets.values(), ['tokens', 'atualizado_em'])
+
+    return None
+
+
+def devolver(cobrancas):
+    """Devolve aos buckets custos já consumidos. cobrancas: lista de (chave, capacidade, custo)."""
+    for chave, capacidade, custo in cobrancas:
+        ThrottleBucket.objects.filter(chave=chave).update(tokens=Least(F('tokens') + custo, capacidade))
+
+
+class DevolveCustoEm4xxMixin:
+    """
+    Para views com TokenBucketThrottle: se a requisição termina em 4xx (validação barata,
+    antes do trabalho externo), devolve o custo estimado. O bucket de 'requisicoes' continua
+    cobrado, para que loops de retentativa ainda sejam limitados.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        cobrancas = getattr(request, 'cobrancas_throttle', None)
+        if cobrancas and 400 <= response.status_code < 500 and response.status_code != 429:
+            devolver([c for c in cobrancas if not c[0].endswith(':requisicoes')])
+            request.cobrancas_throttle = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttling por custo com token buckets por usuário e global.
+
+    A configuração vem de settings.THROTTLE_TOKEN_BUCKETS[escopo], com uma taxa
+    por unidade de custo ('requisicoes', 'minutos', 'tokens'...). As subclasses
+    estimam o custo da requisição em cada unidade.
+    """
+    escopo = None
+
+    def __init__(self):
+        self.espera = None
+
+    def estimar_custos(self, request, view):
+        return {'requisicoes': 1}
+
+    def allow_request(self, request, view):
+        config = getattr(settings, 'THROTTLE_TOKEN_BUCKETS', {}).get(self.escopo)
+        if not config:
+            return True
+
+        # Retentativa com Idempotency-Key já vista normalmente vira replay e não é cobrada.
+        # Se o @idempotente acabar executando a view (registro abandonado assumido ou
+        # original que falhou e liberou a chave), ele chama cobrar() antes de executar.
+        if chave_registrada(request):
+            request.throttles_adiados = getattr(request, 'throttles_adiados', []) + [self]
+            return True
+
+        return self.cobrar(request, view)
+
+    def cobrar(self, request, view):
+        """Consome o custo estimado nos buckets. False (com self.espera) se algum não tiver tokens."""
+        config = settings.THROTTLE_TOKEN_BUCKETS[self.escopo]
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+
+        custos = self.estimar_custos(request, view)
+        demandas = []
+        for alcance, limites in config.items():
+            dono = ident if alcance == 'usuario' else 'global'
+            for unidade, taxa in limites.items():
+                custo = custos.get(unidade)
+                if not custo:
+                    continue
+                capacidade, periodo = parse_taxa(taxa)
+                # Um custo maior que a capacidade nunca passaria; no máximo esvazia o bucket
+                demandas.append((f"{self.escopo}:{dono}:{unidade}", capacidade, capacidade / periodo,
+                                 min(custo, capacidade)))
+
+        if not demandas:
+            return True
+
+        self.espera = consumir(demandas)
+        if self.espera is None:
+            request.cobrancas_throttle = [(chave, capacidade, custo) for chave, capacidade, _, custo in demandas]
+        return self.espera is None
+
+    def wait(self):
+        return self.espera
+
+
+class UploadVideoThrottle(TokenBucketThrottle):
+    escopo = 'upload-video'
+
+    def estimar_custos(self, request, view):
+        # Estimativa pelo Content-Length para rejeitar antes de ler o arquivo
+        tamanho = int(request.META.get('CONTENT_LENGTH') or 0)
+        mb_por_minuto = getattr(settings, 'THROTTLE_MB_POR_MINUTO_VIDEO', 10)
+        minutos = max(1, tamanho / (mb_por_minuto * 1024 * 1024))
+        return {'requisicoes': 1, 'minutos': minutos}
+
+
+class GerarQuizThrottle(TokenBucketThrottle):
+    escopo = 'gerar-quiz'
+
+    def estimar_custos(self, request, view):
+        # Tamanho do texto calculado no banco, sem trazer o JSON da transcrição
+        tamanho = Video.objects.filter(pk=view.kwargs.get('pk')).annotate(
+            tamanho=Length(KT('transcricao__results__transcripts__0__transcript'))
+        ).values_list('tamanho', flat=True).first()
+        # ~4 caracteres por token no prompt, mais a resposta
+        tokens = (tamanho or 0) / 4 + getattr(settings, 'THROTTLE_TOKENS_RESPOSTA_QUIZ', 800)
+        return {'requisicoes': 1, 'tokens': tokens}
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, ProfileViewSet, UploadVideoView, VideoViewSet
+from .views import UserViewSet, ProfileViewSet, UploadVideoView, VideoViewSet, ProgressoView, CatalogoExportView, CatalogoImportView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
@@ -13,5 +13,8 @@ urlpatterns = [
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('upload-video/', UploadVideoView.as_view(), name='upload-video'),
+    path('progresso/', ProgressoView.as_view(), name='progresso'),
+    path('catalogo/exportar/', CatalogoExportView.as_view(), name='catalogo-exportar'),
+    path('catalogo/importar/', CatalogoImportView.as_view(), name='catalogo-importar'),
 ]
     
\ No newline at end of file
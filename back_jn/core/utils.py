@@ -1,4 +1,5 @@
 import boto3
+import json
 import time
 import uuid
 import requests
@@ -55,8 +56,8 @@ def start_transcription_job(media_url):
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
-def generate_quiz_gpt(transcricao: str) -> str:
-    prompt = f"""
+def _prompt_quiz(transcricao: str) -> str:
+    return f"""
 Gere 5 perguntas de múltipla escolha sobre o seguinte conteúdo:
 
 {transcricao}
@@ -75,10 +76,12 @@ Formato esperado (JSON):
 Responda **somente** com um JSON válido. **Não adicione explicações, títulos, comentários ou texto fora do JSON.**
 """
 
+
+def generate_quiz_gpt(transcricao: str) -> str:
     response = client.chat.completions.create(
         model="gpt-4o",  # ou "gpt-3.5-turbo", "gpt-4", "gpt-4o-mini" se disponível
         messages=[
-            {"role": "user", "content": prompt}
+            {"role": "user", "content": _prompt_quiz(transcricao)}
         ],
         temperature=0.5
     )
@@ -86,3 +89,88 @@ Responda **somente** com um JSON válido. **Não adicione explicações, título
     return response.choices[0].message.content.strip()
 
 
+def parse_quiz_json(quiz_raw: str):
+    """Converte a resposta do GPT em JSON. Levanta json.JSONDecodeError se não for válida."""
+    # As vezes o gpt retorna o json como se fosse markdown tratando esse caso
+    if quiz_raw.startswith("```"):
+        quiz_raw = quiz_raw.strip("`").strip()
+        if quiz_raw.startswith("json"):
+            quiz_raw = quiz_raw[4:].strip()
+    return json.loads(quiz_raw)
+
+
+def generate_quiz_gpt_stream(transcricao: str):
+    """Mesma geração do generate_quiz_gpt, mas devolvendo os trechos de texto conforme chegam."""
+    stream = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "user", "content": _prompt_quiz(transcricao)}
+        ],
+        temperature=0.5,
+        stream=True
+    )
+
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class QuizStreamParser:
+    """
+    Extrai objetos JSON completos de um texto que chega aos pedaços.
+
+    Conta chaves fora de strings; quando um objeto de nível mais externo fecha,
+    ele é decodificado e devolvido. Colchetes, vírgulas e cercas de Markdown
+    entre os objetos são ignorados.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+
+    def feed(self, trecho: str) -> list:
+        objetos = []
+        for char in trecho:
+            if self._profundidade == 0:
+                if char == '{':
+                    self._profundidade = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._em_string = False
+                continue
+
+            if char == '"':
+                self._em_string = True
+            elif char == '{':
+                self._profundidade += 1
+            elif char == '}':
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    try:
+                        objetos.append(json.loads(''.join(self._buffer)))
+                    except json.JSONDecodeError:
+                        pass
+                    self._buffer = []
+        return objetos
+
+
+def pergunta_valida(pergunta) -> bool:
+    return (
+        isinstance(pergunta, dict)
+        and isinstance(pergunta.get("pergunta"), str)
+        and isinstance(pergunta.get("alternativas"), list)
+        and len(pergunta["alternativas"]) >= 2
+        and all(isinstance(a, str) for a in pergunta["alternativas"])
+        and isinstance(pergunta.get("correta"), str)
+    )
@@ -1,14 +1,23 @@
 #TODO: Separar em arquivos diferentes essa view esta muito grande criar pasta views e separar em arquivos
 from rest_framework import viewsets,permissions
-from .models import User, Profile, Video, Quiz
-from .serializers import UserSerializer, ProfileSerializer, VideoSerializer
+from .models import User, Profile, Video, Quiz, VideoRelacionados
+from .serializers import UserSerializer, ProfileSerializer, VideoSerializer, HeartbeatSerializer
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser
-from .utils import upload_video_to_s3, start_transcription_job, generate_quiz_gpt
+from .utils import upload_video_to_s3, start_transcription_job, generate_quiz_gpt, generate_quiz_gpt_stream, parse_quiz_json, QuizStreamParser, pergunta_valida
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
+from . import progresso, relacionados, tarefas
+from .catalogo import TIPOS, abrir_ndjson, exportar_ndjson, importar_ndjson
+from .throttling import UploadVideoThrottle, GerarQuizThrottle, DevolveCustoEm4xxMixin
+from .idempotencia import idempotente
+from .renderers import EventStreamRenderer, NDJSONRenderer, NDJSONGzipRenderer, evento_sse
+from rest_framework.renderers import JSONRenderer
 import json
 
 """Usuario, perfil e permissões"""
@@ -52,7 +61,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
 
 #TODO: Adicionar permissões para que o token de usuario seja necessário para acessar os videos
 #TODO: Mudar para async para melhorar performance??
-class VideoViewSet(viewsets.ModelViewSet):
+class VideoViewSet(DevolveCustoEm4xxMixin, viewsets.ModelViewSet):
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -74,8 +83,32 @@ class VideoViewSet(viewsets.ModelViewSet):
             "titulo": video.titulo,
             "quiz": video.quiz.perguntas
         })
+
+    @action(detail=True, methods=['get'], url_path='relacionados')
+    def get_relacionados(self, request, pk=None):
+        # Vizinhos pré-calculados em core/relacionados.py; não carrega a transcrição nem chama a OpenAI
+        video = get_object_or_404(self.get_queryset().only('id'), pk=pk)
+        vizinhos = VideoRelacionados.objects.filter(video=video).values_list('vizinhos', flat=True).first()
+        if vizinhos is None:
+            return Response({"erro": "Ainda não há vídeos relacionados para este vídeo."}, status=404)
+
+        videos = Video.objects.only('id', 'titulo', 'link').in_bulk([v['video'] for v in vizinhos])
+        return Response([
+            {"id": v['video'], "titulo": videos[v['video']].titulo, "link": videos[v['video']].link, "score": v['score']}
+            for v in vizinhos if v['video'] in videos
+        ])
+
+    @action(detail=True, methods=['get'], url_path='progresso', permission_classes=[IsAuthenticated])
+    def get_progresso(self, request, pk=None):
+        # Só o id: não carrega a transcrição para responder o progresso
+        video = get_object_or_404(self.get_queryset().only('id'), pk=pk)
+        registros = progresso.progresso_do_usuario(request.user.id, video_id=video.id)
+        if not registros:
+            return Response({"video": video.id, "posicao_maxima": 0, "duracao": None, "percentual": 0.0})
+        return Response(registros[0])
         
-    @action(detail=True, methods=['post'], url_path='gerar-quiz')
+    @action(detail=True, methods=['post'], url_path='gerar-quiz', throttle_classes=[GerarQuizThrottle])
+    @idempotente
     def gerar_quiz(self, request, pk=None):
         video = self.get_object()
 
@@ -92,12 +125,7 @@ class VideoViewSet(viewsets.ModelViewSet):
             )
             #print("Resposta do GPT:", quiz_raw)
             try:
-                # As vezes o gpt retorna o json como se fosse markdown tratando esse caso
-                if quiz_raw.startswith("```"):
-                    quiz_raw = quiz_raw.strip("`").strip()
-                    if quiz_raw.startswith("json"):
-                        quiz_raw = quiz_raw[4:].strip()
-                quiz_json = json.loads(quiz_raw)
+                quiz_json = parse_quiz_json(quiz_raw)
             except json.JSONDecodeError:
                 return Response({"erro": "OpenAI não retornou um JSON válido", "raw": quiz_raw}, status=500)
 
@@ -105,7 +133,11 @@ class VideoViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"erro": f"Erro ao gerar quiz: {str(e)}"}, status=500)
 
-        quiz = Quiz.objects.create(video=video, perguntas=quiz_json)
+        # A OneToOne em Quiz.video garante no banco que requisições concorrentes não criem dois quizzes
+        try:
+            quiz = Quiz.objects.create(video=video, perguntas=quiz_json)
+        except IntegrityError:
+            return Response({"erro": "Este vídeo já possui um quiz."}, status=400)
 
         return Response({
             "mensagem": "Quiz gerado com sucesso!",
@@ -113,11 +145,65 @@ class VideoViewSet(viewsets.ModelViewSet):
         }, status=201)
     
 
+    @action(detail=True, methods=['post'], url_path='gerar-quiz-stream', throttle_classes=[GerarQuizThrottle],
+            renderer_classes=[JSONRenderer, EventStreamRenderer])
+    @idempotente(esperar=False)
+    def gerar_quiz_stream(self, request, pk=None):
+        video = self.get_object()
+
+        if not video.transcricao:
+            return Response({"erro": "Vídeo ainda não possui transcrição."}, status=400)
+
+        if hasattr(video, 'quiz'):
+            return Response({"erro": "Este vídeo já possui um quiz."}, status=400)
+
+        transcricao = video.transcricao['results']['transcripts'][0]['transcript']
+
+        # Cada pergunta é enviada por SSE assim que o objeto JSON dela fecha na resposta do GPT
+        resultado = {}  # preenchido ao final; o @idempotente guarda para replays
+
+        def eventos():
+            parser = QuizStreamParser()
+            perguntas = []
+            try:
+                for trecho in generate_quiz_gpt_stream(transcricao):
+                    for pergunta in parser.feed(trecho):
+                        if not pergunta_valida(pergunta):
+                            yield evento_sse("invalida", {"raw": pergunta})
+                            continue
+                        perguntas.append(pergunta)
+                        yield evento_sse("pergunta", {"indice": len(perguntas) - 1, **pergunta})
+            except Exception as e:
+                yield evento_sse("erro", {"erro": f"Erro ao gerar quiz: {str(e)}"})
+                return
+
+            if not perguntas:
+                yield evento_sse("erro", {"erro": "OpenAI não retornou nenhuma pergunta válida"})
+                return
+
+            try:
+                Quiz.objects.create(video=video, perguntas=perguntas)
+            except IntegrityError:
+                yield evento_sse("erro", {"erro": "Este vídeo já possui um quiz."})
+                return
+
+            resultado.update(status=201, dados={"mensagem": "Quiz gerado com sucesso!", "quiz": perguntas})
+            yield evento_sse("fim", {"mensagem": "Quiz gerado com sucesso!", "total": len(perguntas)})
+
+        response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx não deve segurar os eventos
+        response.resultado_idempotencia = resultado
+        return response
+
+
 #TODO: implemnetar logica para que somente admins ou instrutores possam criar videos. Talvez seja interessante guardar o id de quem criou...
 #TODO: discutir solucoes mais performaticas para a transcrição de videos, legendas e armazenamento no banco de dados
-class UploadVideoView(APIView):
+class UploadVideoView(DevolveCustoEm4xxMixin, APIView):
     parser_classes = [MultiPartParser]
+    throttle_classes = [UploadVideoThrottle]
 
+    @idempotente
     def post(self, request):
         video = request.FILES.get('video')
         titulo = request.data.get('titulo', video.name)
@@ -136,9 +222,83 @@ class UploadVideoView(APIView):
             transcricao=transcricao_json
         )
 
+        if transcricao_json:
+            # Atualizar o índice de relacionados lê a matriz inteira; fica fora da requisição
+            tarefas.enfileirar(relacionados.atualizar_video, novo_video.id, transcricao_json)
+
         return Response({
             "id": novo_video.id,
             "titulo": novo_video.titulo,
             "link": novo_video.link,
             "transcricao": transcricao_json['results']['transcripts'][0]['transcript'] if transcricao_json else "Falha na transcrição"
         })
+
+
+
+#Heartbeats do player vão para um buffer em memória (core/progresso.py) e são gravados em lote
+class ProgressoView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_heartbeats = 500
+
+    def get(self, request):
+        return Response(progresso.progresso_do_usuario(request.user.id))
+
+    def post(self, request):
+        dados = request.data if isinstance(request.data, list) else [request.data]
+
+        serializer = HeartbeatSerializer(data=dados, many=True, max_length=self.max_heartbeats)
+        serializer.is_valid(raise_exception=True)
+
+        progresso.registrar(request.user.id, serializer.validated_data)
+
+        return Response({"recebidos": len(serializer.validated_data)}, status=202)
+
+
+
+#Exportação/importação do catálogo em NDJSON para mover conteúdo entre ambientes (ver core/catalogo.py)
+class CatalogoExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [JSONRenderer, NDJSONRenderer, NDJSONGzipRenderer]
+
+    def get(self, request):
+        tipos = [t for t in request.query_params.get('tipos', ','.join(TIPOS)).split(',') if t]
+        if set(tipos) - set(TIPOS):
+            return Response({"erro": f"Tipos válidos: {', '.join(TIPOS)}"}, status=400)
+
+        compactar = (
+            request.query_params.get('gzip') in ('1', 'true')
+            or request.accepted_renderer.media_type == NDJSONGzipRenderer.media_type
+        )
+        nome = 'catalogo.ndjson.gz' if compactar else 'catalogo.ndjson'
+
+        response = StreamingHttpResponse(exportar_ndjson(tipos, compactar=compactar), content_type='application/x-ndjson')
+        if compactar:
+            response['Content-Type'] = 'application/gzip'
+        response['Content-Disposition'] = f'attachment; filename="{nome}"'
+        return response
+
+
+class CatalogoImportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        arquivo = request.FILES.get('arquivo')
+        if not arquivo:
+            return Response({"erro": "Arquivo não enviado."}, status=400)
+
+        try:
+            inicio = int(request.data.get('inicio', 0))
+        except ValueError:
+            return Response({"erro": "inicio deve ser um número de linhas."}, status=400)
+
+        confirmadas = [inicio]
+        try:
+            total = importar_ndjson(abrir_ndjson(arquivo), inicio=inicio, ao_confirmar=confirmadas.append)
+        except Exception as e:
+            # O cliente pode reenviar o arquivo com inicio=processadas para continuar de onde parou
+            return Response({"erro": f"Erro na importação: {str(e)}", "processadas": confirmadas[-1]}, status=500)
+
+        # Transcrições importadas chegam por bulk_update, sem passar pelo atualizar_video
+        tarefas.enfileirar(relacionados.construir_indice)
+        return Response({"mensagem": "Importação concluída", "processadas": total})